@@ -1,11 +1,17 @@
 # main_app.py - NDA Dashboard with Spelling Quality Analysis from Column Q
 import streamlit as st
 import pandas as pd
-from datetime import datetime, timedelta
+from datetime import datetime
 import io
 import json
 import re
 import os
+import hashlib
+import tempfile
+import numpy as np
+import pyarrow as pa
+import pyarrow.parquet as pq
+from typing import NamedTuple, Optional
 
 # Page config
 st.set_page_config(
@@ -15,120 +21,100 @@ st.set_page_config(
 )
 
 # ==================== Quality Analysis Functions ====================
-def parse_spelling_errors(spelling_text):
+# Issue categories reported in the Column Q spelling text
+ISSUE_TYPES = ['TYPOS', 'PUNCTUATION', 'GRAMMAR', 'TYPOGRAPHY',
+               'REDUNDANCY', 'CASING', 'MISC', 'REPETITIONS_STYLE']
+
+# One issue is "<text> (<TYPE>: <note>)"; compiled once at import for issue_details
+_ISSUE_ALTERNATION = '|'.join(ISSUE_TYPES)
+DETAIL_PATTERN = re.compile(rf'([^;]+)\s*\(({_ISSUE_ALTERNATION}):[^)]+\)')
+
+# Severity weights: points deducted from 100 per issue of each type
+ISSUE_WEIGHTS = {
+    'TYPOS': 5,                 # Typos are serious
+    'PUNCTUATION': 2,           # Punctuation is less critical
+    'GRAMMAR': 4,               # Grammar errors are important
+    'TYPOGRAPHY': 1,            # Typography is minor
+    'REDUNDANCY': 2,            # Redundancy affects readability
+    'CASING': 2,                # Casing issues are minor
+    'MISC': 3,                  # Misc issues vary
+    'REPETITIONS_STYLE': 2      # Style issues
+}
+
+def score_spelling_column(spelling):
     """
-    Parse the spelling error text from Column Q to extract detailed quality metrics
+    Score a whole Column Q Series: per-type marker counts, Total_Issues and Quality_Score (0-100)
     """
-    if pd.isna(spelling_text) or spelling_text == '' or spelling_text is None:
-        return {
-            'total_issues': 0,
-            'typos': 0,
-            'punctuation': 0,
-            'grammar': 0,
-            'typography': 0,
-            'redundancy': 0,
-            'casing': 0,
-            'misc': 0,
-            'quality_score': 100,
-            'issue_details': []
-        }
-    
-    # Convert to string and count different types of issues
-    error_text = str(spelling_text)
-    
-    # Count different error types using regex
-    typos = len(re.findall(r'TYPOS:', error_text))
-    punctuation = len(re.findall(r'PUNCTUATION:', error_text))
-    grammar = len(re.findall(r'GRAMMAR:', error_text))
-    typography = len(re.findall(r'TYPOGRAPHY:', error_text))
-    redundancy = len(re.findall(r'REDUNDANCY:', error_text))
-    casing = len(re.findall(r'CASING:', error_text))
-    misc = len(re.findall(r'MISC:', error_text))
-    repetitions = len(re.findall(r'REPETITIONS_STYLE:', error_text))
-    
-    total_issues = typos + punctuation + grammar + typography + redundancy + casing + misc + repetitions
-    
-    # Extract individual issues
-    issue_details = []
-    
-    # Parse each issue type
-    patterns = {
-        'TYPOS': r'([^;]+)\s*\(TYPOS:[^)]+\)',
-        'PUNCTUATION': r'([^;]+)\s*\(PUNCTUATION:[^)]+\)',
-        'GRAMMAR': r'([^;]+)\s*\(GRAMMAR:[^)]+\)',
-        'TYPOGRAPHY': r'([^;]+)\s*\(TYPOGRAPHY:[^)]+\)',
-        'REDUNDANCY': r'([^;]+)\s*\(REDUNDANCY:[^)]+\)',
-        'CASING': r'([^;]+)\s*\(CASING:[^)]+\)',
-        'MISC': r'([^;]+)\s*\(MISC:[^)]+\)',
-        'REPETITIONS_STYLE': r'([^;]+)\s*\(REPETITIONS_STYLE:[^)]+\)'
-    }
-    
-    for error_type, pattern in patterns.items():
-        matches = re.findall(pattern, error_text)
-        for match in matches:
-            issue_details.append({
-                'type': error_type,
-                'text': match.strip()
-            })
-    
-    # Calculate quality score based on issue count and severity
-    # Start with 100 and deduct points based on issues
-    quality_score = 100
-    
-    # Deduct points based on error severity
-    quality_score -= typos * 5          # Typos are serious
-    quality_score -= grammar * 4        # Grammar errors are important
-    quality_score -= punctuation * 2    # Punctuation is less critical
-    quality_score -= typography * 1     # Typography is minor
-    quality_score -= redundancy * 2     # Redundancy affects readability
-    quality_score -= casing * 2         # Casing issues are minor
-    quality_score -= misc * 3           # Misc issues vary
-    quality_score -= repetitions * 2    # Style issues
-    
-    # Ensure score stays between 0 and 100
-    quality_score = max(0, min(100, quality_score))
-    
-    return {
-        'total_issues': total_issues,
-        'typos': typos,
-        'punctuation': punctuation,
-        'grammar': grammar,
-        'typography': typography,
-        'redundancy': redundancy,
-        'casing': casing,
-        'misc': misc + repetitions,
-        'quality_score': quality_score,
-        'issue_details': issue_details
-    }
-
-def categorize_quality_score(score):
-    """Categorize quality score into bands"""
-    if score >= 90:
-        return "Excellent"
-    elif score >= 75:
-        return "Good"
-    elif score >= 60:
-        return "Fair"
-    elif score >= 40:
-        return "Poor"
-    else:
-        return "Very Poor"
+    text = spelling.fillna('')
+    
+    # One N x 8 count matrix; the score is a single matrix-vector product with the weights
+    count_matrix = np.column_stack([text.str.count(f'{issue}:').to_numpy(dtype=np.int64) for issue in ISSUE_TYPES])
+    penalty = count_matrix @ np.array([ISSUE_WEIGHTS[issue] for issue in ISSUE_TYPES], dtype=np.int64)
+    quality_score = np.clip(100 - penalty, 0, 100).astype(np.int8)
+    total_issues = count_matrix.sum(axis=1)
+    
+    # Counts are small non-negative ints and scores fit in 0-100, so store them narrow
+    counts = {issue: pd.to_numeric(count_matrix[:, i], downcast='unsigned') for i, issue in enumerate(ISSUE_TYPES)}
+    
+    return pd.DataFrame({
+        'Quality_Score': quality_score,
+        'Total_Issues': pd.to_numeric(total_issues, downcast='unsigned'),
+        'Typos_Count': counts['TYPOS'],
+        'Grammar_Issues': counts['GRAMMAR'],
+        'Punctuation_Issues': counts['PUNCTUATION'],
+        'Typography_Issues': counts['TYPOGRAPHY']
+    }, index=spelling.index)
+
+# Sidebar band edges: Poor <60, Fair 60-74, Good 75-89, Excellent >=90
+# (np.histogram bins are half-open except the last, which includes 100)
+QUALITY_BAND_EDGES = [0, 60, 75, 90, 100]
+
+# Quality_Category bands: Excellent >=90, Good 75-89, Fair 60-74, Poor 40-59, Very Poor <40
+# (scores are whole numbers in 0-100; pd.cut bins are right-inclusive)
+QUALITY_CATEGORY_BINS = [-1, 39, 59, 74, 89, 100]
+QUALITY_CATEGORY_LABELS = ['Very Poor', 'Poor', 'Fair', 'Good', 'Excellent']
 
 # ==================== Data Persistence Functions ====================
+# The enriched tracker frame is stored as parquet (dtypes preserved, no code on load);
+# the JSON file holds the metadata plus the small Dashboard / Run Log sheets as records
+SHARED_META_FILE = 'shared_dashboard_data.json'
+SHARED_FRAMES_FILE = 'shared_dashboard_data.parquet'
+
+def _to_arrow_table(df, data_key):
+    """Arrow table for the shared parquet file, tagged with the package's data_key"""
+    # Arrow needs string column names and one type per column; mixed-type
+    # object columns from an unknown sheet layout are stored as text
+    df = df.rename(columns=str)
+    for col in df.columns[df.dtypes == object]:
+        df[col] = df[col].astype('string[pyarrow]')
+    
+    table = pa.Table.from_pandas(df, preserve_index=False)
+    return table.replace_schema_metadata({**table.schema.metadata, b'data_key': str(data_key).encode()})
+
 def save_data_to_cloud():
     """Save data to a persistent location"""
     if st.session_state.uploaded_data is not None:
+        # Store the enriched frame (a superset of the raw sheet) so loaders skip enrichment.
+        # Write to a temp file and swap it in, so readers never see a half-written file;
+        # the metadata is written only after the frames are in place.
+        enriched = enrich_dataframe(st.session_state.data_key, st.session_state.uploaded_data)
+        tmp_path = SHARED_FRAMES_FILE + '.tmp'
+        pq.write_table(_to_arrow_table(enriched, st.session_state.data_key), tmp_path)
+        os.replace(tmp_path, SHARED_FRAMES_FILE)
+        
         data_package = {
-            'upload_time': datetime.now().isoformat(),
-            'data': st.session_state.uploaded_data.to_json(orient='records', date_format='iso'),
-            'dashboard_data': st.session_state.dashboard_data.to_json(orient='records', date_format='iso') if 'dashboard_data' in st.session_state and st.session_state.dashboard_data is not None else None,
-            'run_log': st.session_state.run_log.to_json(orient='records', date_format='iso') if 'run_log' in st.session_state and st.session_state.run_log is not None else None,
-            'last_updated_by': st.session_state.get('user_name', 'Admin')
+            'upload_time': st.session_state.last_upload_time.isoformat(),
+            'frames_file': SHARED_FRAMES_FILE,
+            'enriched': True,
+            'dashboard_data': st.session_state.dashboard_data.to_json(orient='records', date_format='iso') if st.session_state.get('dashboard_data') is not None else None,
+            'run_log': st.session_state.run_log.to_json(orient='records', date_format='iso') if st.session_state.get('run_log') is not None else None,
+            'last_updated_by': st.session_state.get('user_name', 'Admin'),
+            'data_key': st.session_state.get('data_key')
         }
         
         st.session_state.shared_data = data_package
         
-        with open('shared_dashboard_data.json', 'w') as f:
+        with open(SHARED_META_FILE, 'w') as f:
             json.dump(data_package, f)
         
         return True
@@ -139,9 +125,9 @@ def load_shared_data():
     if 'shared_data' in st.session_state:
         return st.session_state.shared_data
     
-    if os.path.exists('shared_dashboard_data.json'):
+    if os.path.exists(SHARED_META_FILE):
         try:
-            with open('shared_dashboard_data.json', 'r') as f:
+            with open(SHARED_META_FILE, 'r') as f:
                 data_package = json.load(f)
                 st.session_state.shared_data = data_package
                 return data_package
@@ -150,23 +136,317 @@ def load_shared_data():
     
     return None
 
+def _read_package_frames(data_package, package_key):
+    """
+    Return (data, dashboard_data, run_log) from a package, parquet or legacy JSON.
+    Returns None when the frames on disk belong to a different package.
+    """
+    def from_json(payload):
+        return pd.read_json(io.StringIO(payload), orient='records') if payload else None
+    
+    dashboard_data = from_json(data_package.get('dashboard_data'))
+    run_log = from_json(data_package.get('run_log'))
+    
+    if 'frames_file' in data_package:
+        # Only our own parquet file - never a path taken from the editable JSON
+        # (packages from the short-lived pickle format are not read at all)
+        if data_package['frames_file'] != SHARED_FRAMES_FILE:
+            return None
+        table = pq.read_table(SHARED_FRAMES_FILE)
+        if (table.schema.metadata or {}).get(b'data_key', b'').decode() != str(package_key):
+            return None
+        return table.to_pandas(), dashboard_data, run_log
+    
+    # Packages saved before the parquet format carried the frames as JSON records
+    return normalize_dtypes(from_json(data_package['data'])), dashboard_data, run_log
+
 def load_data_from_package(data_package):
     """Load data from a saved package"""
     if data_package:
-        st.session_state.uploaded_data = pd.read_json(data_package['data'], orient='records')
+        # Skip re-reading when this session already holds the same package
+        package_key = data_package.get('data_key') or data_package['upload_time']
+        if st.session_state.get('loaded_package_key') == package_key and st.session_state.uploaded_data is not None:
+            return True
+        
+        try:
+            frames = _read_package_frames(data_package, package_key)
+        except (OSError, pa.ArrowException, ValueError, KeyError):
+            # Missing or half-written frames file: treat as no shared data
+            st.session_state.pop('shared_data', None)
+            return False
         
-        if data_package.get('dashboard_data'):
-            st.session_state.dashboard_data = pd.read_json(data_package['dashboard_data'], orient='records')
+        if frames is None:
+            # Another session saved since this metadata was cached - re-read it from disk
+            st.session_state.pop('shared_data', None)
+            fresh_package = load_shared_data()
+            if fresh_package and fresh_package.get('data_key') not in (None, package_key):
+                return load_data_from_package(fresh_package)
+            return False
         
-        if data_package.get('run_log'):
-            st.session_state.run_log = pd.read_json(data_package['run_log'], orient='records')
+        data, dashboard_data, run_log = frames
+        st.session_state.uploaded_data = data
+        
+        if data_package.get('enriched'):
+            # Already carries the derived columns - the main block uses it as-is
+            st.session_state.enriched_key = package_key
+        
+        if dashboard_data is not None:
+            st.session_state.dashboard_data = dashboard_data
+        
+        if run_log is not None:
+            st.session_state.run_log = run_log
         
         st.session_state.last_upload_time = datetime.fromisoformat(data_package['upload_time'])
         st.session_state.last_updated_by = data_package.get('last_updated_by', 'Unknown')
+        st.session_state.data_key = package_key
+        st.session_state.loaded_package_key = package_key
         
         return True
     return False
 
+# ==================== Data Loading Functions ====================
+# Sheets read from the workbook and the columns kept from each (None keeps all)
+NEEDED_COLS = {
+    'Test Sheet': ['Timestamp', 'From', 'Subject', 'Customer', 'Status',
+                   'Thread ID', 'Turnaround Time (hrs)', 'Spelling_Errors'],
+    'Dashboard': None,
+    'Run Log': None
+}
+
+# Column Q (index 16) holds the spelling data and usually has no header
+SPELLING_COLUMN_INDEX = 16
+
+# Low-cardinality text columns stored as category dtype
+CATEGORY_COLUMNS = ('Status', 'Customer', 'From')
+
+# Free-text columns stored as Arrow-backed strings (one contiguous buffer)
+STRING_COLUMNS = ('Subject', 'Spelling_Errors')
+
+def _column_filter(needed):
+    """Build a usecols callable that keeps the needed columns plus unlabeled Column Q"""
+    unnamed_q = f'Unnamed: {SPELLING_COLUMN_INDEX}'
+    return lambda col: col in needed or col == unnamed_q
+
+def normalize_dtypes(df):
+    """Apply load-time dtypes (category/Arrow text, datetime64 Timestamp) and the search column"""
+    for col in CATEGORY_COLUMNS:
+        if col in df.columns and not isinstance(df[col].dtype, pd.CategoricalDtype):
+            df[col] = df[col].astype('category')
+    
+    for col in STRING_COLUMNS:
+        if col in df.columns:
+            df[col] = df[col].astype('string[pyarrow]')
+    
+    if 'Timestamp' in df.columns and not pd.api.types.is_datetime64_any_dtype(df['Timestamp']):
+        try:
+            # Shared JSON always stores ISO strings - skip per-value format inference
+            df['Timestamp'] = pd.to_datetime(df['Timestamp'], format='ISO8601')
+        except (ValueError, TypeError):
+            df['Timestamp'] = pd.to_datetime(df['Timestamp'], errors='coerce')
+    
+    # Lowercased subject for the search filter, so keystrokes don't re-lowercase the column
+    if 'Subject' in df.columns:
+        df['_subject_lower'] = df['Subject'].str.lower()
+    return df
+
+def _parse_sheet(excel_file, name, is_main):
+    """Parse one sheet from an open ExcelFile; the main frame always gets normalize_dtypes"""
+    if name == 'Test Sheet':
+        df = excel_file.parse(
+            name,
+            usecols=_column_filter(NEEDED_COLS[name]),
+            dtype={col: 'category' for col in CATEGORY_COLUMNS}
+        )
+        df = df.rename(columns={f'Unnamed: {SPELLING_COLUMN_INDEX}': 'Spelling_Errors'})
+        return normalize_dtypes(df)
+    
+    if is_main:
+        # First-sheet fallback: unknown layout, keep all columns
+        # (even when that first sheet is 'Dashboard' or 'Run Log')
+        return normalize_dtypes(excel_file.parse(name))
+    
+    return excel_file.parse(name, usecols=NEEDED_COLS[name])
+
+def _parse_workbook(path):
+    """Parse the needed sheets of a workbook on disk through a single ExcelFile handle"""
+    with pd.ExcelFile(path, engine="calamine") as excel_file:
+        sheet_names = excel_file.sheet_names
+        
+        # Test Sheet if present, otherwise the full first sheet; it goes first
+        # so callers can take next(iter(...)) as the main frame
+        main = 'Test Sheet' if 'Test Sheet' in sheet_names else sheet_names[0]
+        wanted = dict.fromkeys([main] + [name for name in NEEDED_COLS if name in sheet_names])
+        
+        return {name: _parse_sheet(excel_file, name, name == main) for name in wanted}
+
+@st.cache_data(show_spinner=False, ttl=3600, max_entries=4)
+def load_workbook(file_bytes, file_name):
+    """
+    Parse the uploaded workbook into a dict of sheet DataFrames.
+    Cached on the file bytes so Streamlit reruns skip Excel parsing entirely;
+    the cache is process-wide, so it is bounded to a few recent uploads.
+    """
+    # Spool to a temp file so the reader seeks on disk rather than
+    # holding another in-memory copy of the upload
+    suffix = os.path.splitext(file_name)[1] or '.xlsx'
+    with tempfile.NamedTemporaryFile(suffix=suffix, delete=False) as tmp:
+        tmp.write(file_bytes)
+        path = tmp.name
+    
+    try:
+        return _parse_workbook(path)
+    finally:
+        os.remove(path)
+
+# ==================== Cached Aggregations ====================
+@st.cache_data(show_spinner=False, ttl=3600, max_entries=4)
+def enrich_dataframe(data_key, _df):
+    """
+    Add the date and Column Q quality columns the tabs rely on.
+    Keyed on data_key so widget reruns skip re-deriving them.
+    """
+    df = _df.copy()
+    
+    # Add date columns
+    # Timestamp is already datetime64 (see normalize_dtypes)
+    if 'Timestamp' in df.columns:
+        timestamps = df['Timestamp']
+        df['Date'] = timestamps.dt.floor('D')
+        # ISO year + ISO week, so late-December/early-January rows land in the right week
+        df['Year_Week'] = timestamps.dt.strftime('%G-W%V').astype('category')
+    
+    # Process spelling quality data from Column Q
+    if 'Spelling_Errors' in df.columns:
+        # Count issue markers for every document in one vectorized pass per type
+        quality_metrics = score_spelling_column(df['Spelling_Errors'])
+        for column in quality_metrics.columns:
+            df[column] = quality_metrics[column]
+        df['Quality_Category'] = pd.cut(df['Quality_Score'], bins=QUALITY_CATEGORY_BINS, labels=QUALITY_CATEGORY_LABELS)
+        
+        # Create issue summary
+        issue_summary = ("Typos: " + df['Typos_Count'].astype(str)
+                         + ", Grammar: " + df['Grammar_Issues'].astype(str)
+                         + ", Punctuation: " + df['Punctuation_Issues'].astype(str))
+        df['Issue_Summary'] = issue_summary.where(df['Total_Issues'] > 0, "No issues")
+    else:
+        # Fallback if no spelling data
+        df['Quality_Score'] = 100
+        df['Total_Issues'] = 0
+        df['Quality_Category'] = 'No Data'
+    
+    return df
+
+class KPIs(NamedTuple):
+    """Headline KPI scalars; None marks a KPI whose source column is missing"""
+    total: int
+    completed: Optional[int]
+    completion_rate: Optional[float]
+    avg_turnaround: Optional[float]
+    avg_quality: float
+    total_issues: Optional[int]
+    avg_issues: Optional[float]
+    total_typos: Optional[int]
+
+@st.cache_data(show_spinner=False)
+def compute_kpis(data_key, _df):
+    """
+    Compute the headline KPIs once per dataset.
+    Keyed on data_key so widget reruns reuse the cached scalars.
+    """
+    total = len(_df)
+    completed = completion_rate = avg_turnaround = total_issues = avg_issues = total_typos = None
+    
+    if 'Status' in _df.columns:
+        status_counts = _df['Status'].value_counts()
+        completed = int(status_counts.get('Completed', 0))
+        completion_rate = (completed / total * 100) if total > 0 else 0
+    
+    if 'Turnaround Time (hrs)' in _df.columns:
+        turnaround = _df['Turnaround Time (hrs)'].to_numpy(dtype=np.float64, na_value=np.nan)
+        turnaround = turnaround[~np.isnan(turnaround)]
+        avg_turnaround = turnaround.mean() if turnaround.size else np.nan
+    
+    if 'Total_Issues' in _df.columns:
+        # Total_Issues has no NaNs, so one sum gives both the total and the mean
+        total_issues = int(_df['Total_Issues'].to_numpy().sum())
+        avg_issues = total_issues / total if total > 0 else np.nan
+    
+    if 'Typos_Count' in _df.columns:
+        total_typos = int(_df['Typos_Count'].sum())
+    
+    return KPIs(
+        total=total,
+        completed=completed,
+        completion_rate=completion_rate,
+        avg_turnaround=avg_turnaround,
+        avg_quality=_df['Quality_Score'].mean(),
+        total_issues=total_issues,
+        avg_issues=avg_issues,
+        total_typos=total_typos
+    )
+
+@st.cache_data(show_spinner=False, ttl=3600, max_entries=4)
+def issue_details(data_key, _df):
+    """
+    Every Column Q issue as one long-form frame indexed by (row, match).
+    One extractall pass covers every document.
+    """
+    details = _df['Spelling_Errors'].fillna('').str.extractall(DETAIL_PATTERN)
+    details.columns = ['Text', 'Type']
+    details['Text'] = details['Text'].str.strip()
+    details['Type'] = details['Type'].astype('category')
+    return details[['Type', 'Text']]
+
+class QualityBands(NamedTuple):
+    """Document counts per sidebar quality band (see QUALITY_BAND_EDGES)"""
+    poor: int
+    fair: int
+    good: int
+    excellent: int
+
+@st.cache_data(show_spinner=False)
+def quality_bands(data_key, _df):
+    """Bucket Quality_Score into the sidebar bands with one histogram pass per dataset"""
+    band_counts, _ = np.histogram(_df['Quality_Score'].to_numpy(), bins=QUALITY_BAND_EDGES)
+    return QualityBands(*(int(count) for count in band_counts))
+
+@st.cache_data(show_spinner=False)
+def unique_values(data_key, column, _df):
+    """Distinct non-null values of a column, computed once per dataset"""
+    return _df[column].dropna().unique().tolist()
+
+@st.cache_data(show_spinner=False)
+def trend_frames(data_key, _df):
+    """
+    Build the per-day trend series for the Trends tab from a single groupby.
+    Keyed on data_key so tab switches and widget reruns skip the groupby.
+    """
+    aggregations = {'Quality_Score': 'mean'}
+    for col in ('Total_Issues', 'Typos_Count', 'Grammar_Issues', 'Punctuation_Issues'):
+        if col in _df.columns:
+            aggregations[col] = 'sum'
+    
+    return _df.groupby('Date').agg(aggregations)
+
+@st.cache_data(show_spinner=False)
+def worst_documents(data_key, _df, n=10):
+    """Top-n documents by Total_Issues, computed once per dataset"""
+    # nlargest already selects by partial partition, not a full sort
+    columns = [col for col in ['Subject', 'Customer', 'Quality_Score', 'Total_Issues', 'Issue_Summary']
+               if col in _df.columns]
+    return _df.nlargest(n, 'Total_Issues')[columns]
+
+@st.cache_data(show_spinner=False)
+def customer_quality(data_key, _df):
+    """Per-customer quality table for the Quality Analysis tab, computed once per dataset"""
+    table = _df.groupby('Customer').agg({
+        'Quality_Score': 'mean',
+        'Total_Issues': 'sum',
+        'Subject': 'count'
+    }).round(1)
+    table.columns = ['Avg Quality Score', 'Total Issues', 'Document Count']
+    return table.sort_values('Avg Quality Score', ascending=False)
+
 # ==================== Access Control ====================
 def check_access_mode():
     """Determine if user is in admin mode or viewer mode"""
@@ -174,6 +454,255 @@ def check_access_mode():
     # You can add authentication later if needed
     return 'admin'  # Always admin mode for now so you can upload
 
+# ==================== Display Settings ====================
+# Most rows sent to the browser for the NDA Threads table
+MAX_TABLE_ROWS = 1000
+
+# ==================== Tab Renderers ====================
+@st.fragment
+def render_threads_tab(df):
+    """
+    NDA Threads tab: filters plus the filtered table.
+    Runs as a fragment so filter changes rerun only this tab, not the whole app.
+    """
+    st.header("NDA Email Threads with Quality Metrics")
+    
+    # Filters - First Row
+    col1, col2, col3 = st.columns(3)
+    
+    with col1:
+        if 'Status' in df.columns:
+            status_options = df['Status'].cat.categories.tolist()
+            status_filter = st.multiselect(
+                "Filter by Status",
+                options=status_options,
+                default=status_options
+            )
+        else:
+            status_filter = []
+    
+    with col2:
+        if 'Customer' in df.columns:
+            customer_filter = st.multiselect(
+                "Filter by Customer",
+                options=df['Customer'].cat.categories.tolist(),
+                default=[]
+            )
+        else:
+            customer_filter = []
+    
+    with col3:
+        if 'Quality_Category' in df.columns:
+            quality_filter = st.multiselect(
+                "Filter by Quality",
+                options=unique_values(st.session_state.data_key, 'Quality_Category', df),
+                default=[]
+            )
+        else:
+            quality_filter = []
+    
+    # Filters - Second Row
+    col1, col2, col3 = st.columns(3)
+    
+    with col1:
+        search_term = st.text_input("🔍 Search in Subject", "")
+    
+    with col2:
+        min_issues = st.number_input("Min Issues to Show", min_value=0, value=0)
+    
+    with col3:
+        # Quality score range filter
+        if 'Quality_Score' in df.columns:
+            score_range = st.slider(
+                "Quality Score Range",
+                min_value=0,
+                max_value=100,
+                value=(0, 100),
+                step=5
+            )
+        else:
+            score_range = (0, 100)
+    
+    # Apply filters - build one combined mask and index the frame once
+    mask = np.ones(len(df), dtype=bool)
+    
+    if status_filter and 'Status' in df.columns:
+        mask &= df['Status'].isin(status_filter).to_numpy(dtype=bool)
+    
+    if customer_filter and 'Customer' in df.columns:
+        mask &= df['Customer'].isin(customer_filter).to_numpy(dtype=bool)
+    
+    if quality_filter and 'Quality_Category' in df.columns:
+        mask &= df['Quality_Category'].isin(quality_filter).to_numpy(dtype=bool)
+    
+    if search_term and 'Subject' in df.columns:
+        mask &= df['_subject_lower'].str.contains(search_term.lower(), regex=False, na=False).to_numpy(dtype=bool)
+    
+    # Counts are never negative and scores are clipped to 0-100, so the
+    # default thresholds match every row - skip those scans
+    if min_issues > 0 and 'Total_Issues' in df.columns:
+        mask &= df['Total_Issues'].to_numpy() >= min_issues
+    
+    if score_range != (0, 100) and 'Quality_Score' in df.columns:
+        scores = df['Quality_Score'].to_numpy()
+        mask &= (scores >= score_range[0]) & (scores <= score_range[1])
+    
+    # Project to the displayed columns in the same indexing step
+    display_columns = ['Timestamp', 'Subject', 'Customer', 'Status', 'Quality_Score', 
+                      'Total_Issues', 'Quality_Category', 'Issue_Summary']
+    display_columns = [col for col in display_columns if col in df.columns] or df.columns[:10].tolist()
+    filtered_df = df.loc[mask, display_columns]
+    
+    # Display
+    st.markdown(f"**Showing {len(filtered_df)} of {len(df)} records**")
+    
+    # st.dataframe ships every row to the browser, so cap what is sent
+    if len(filtered_df) > MAX_TABLE_ROWS:
+        st.caption(f"Table limited to the first {MAX_TABLE_ROWS} matching records - refine the filters to narrow it down")
+    
+    st.dataframe(
+        filtered_df.head(MAX_TABLE_ROWS),
+        use_container_width=True,
+        height=400,
+        hide_index=True
+    )
+
+@st.fragment
+def render_daily_tab(df):
+    """
+    Daily Analytics tab: per-day metrics for the selected date.
+    Runs as a fragment so picking a date reruns only this tab.
+    """
+    st.header("Daily Analytics Dashboard")
+    
+    if 'Date' in df.columns:
+        # Unparseable Timestamp cells are coerced to NaT at load; they have no day to pick
+        available_dates = sorted(df['Date'].dropna().unique(), reverse=True)
+        selected_date = st.selectbox(
+            "Select Date",
+            available_dates,
+            index=0,
+            format_func=lambda d: pd.Timestamp(d).strftime('%Y-%m-%d')
+        )
+        
+        daily_df = df[df['Date'] == selected_date]
+        
+        # Daily metrics
+        col1, col2, col3, col4 = st.columns(4)
+        
+        with col1:
+            st.metric("Total NDAs", len(daily_df))
+        
+        with col2:
+            daily_avg_quality = daily_df['Quality_Score'].mean()
+            st.metric("Avg Quality", f"{daily_avg_quality:.0f}/100")
+        
+        with col3:
+            if 'Total_Issues' in daily_df.columns:
+                daily_total_issues = daily_df['Total_Issues'].sum()
+                st.metric("Total Issues", daily_total_issues)
+        
+        with col4:
+            if 'Typos_Count' in daily_df.columns:
+                daily_typos = daily_df['Typos_Count'].sum()
+                st.metric("Typos Found", daily_typos)
+        
+        # Quality distribution for the day
+        st.subheader("Quality Distribution")
+        if 'Quality_Category' in daily_df.columns:
+            # Categorical value_counts lists every band; keep only the observed ones
+            daily_quality_dist = daily_df['Quality_Category'].value_counts().loc[lambda counts: counts > 0]
+            st.bar_chart(daily_quality_dist)
+
+@st.fragment
+def render_weekly_tab(df):
+    """
+    Weekly Analytics tab: per-week metrics for the selected ISO week.
+    Runs as a fragment so picking a week reruns only this tab.
+    """
+    st.header("Weekly Analytics Dashboard")
+    
+    if 'Year_Week' in df.columns:
+        # Categories are already sorted, and 'YYYY-Www' sorts chronologically
+        available_weeks = df['Year_Week'].cat.categories[::-1].tolist()
+        selected_week = st.selectbox("Select Week", available_weeks, index=0 if available_weeks else None)
+        
+        if selected_week:
+            weekly_df = df[df['Year_Week'] == selected_week]
+            
+            # Weekly metrics
+            col1, col2, col3, col4, col5 = st.columns(5)
+            
+            with col1:
+                st.metric("Total NDAs", len(weekly_df))
+            
+            with col2:
+                weekly_avg_quality = weekly_df['Quality_Score'].mean()
+                st.metric("Avg Quality", f"{weekly_avg_quality:.0f}/100")
+            
+            with col3:
+                if 'Total_Issues' in weekly_df.columns:
+                    weekly_issues = weekly_df['Total_Issues'].sum()
+                    st.metric("Total Issues", weekly_issues)
+            
+            with col4:
+                excellent_week = int((weekly_df['Quality_Score'] >= 90).sum())
+                st.metric("Excellent Docs", excellent_week)
+            
+            with col5:
+                poor_week = int((weekly_df['Quality_Score'] < 60).sum())
+                st.metric("Poor Docs", poor_week)
+            
+            # Daily quality trend within week
+            if 'Date' in weekly_df.columns:
+                st.subheader("Daily Quality Trend")
+                # Slice the cached per-day means instead of regrouping the week
+                trends = trend_frames(st.session_state.data_key, df)
+                in_week = trends.index.isin(weekly_df['Date'].unique())
+                st.line_chart(trends.loc[in_week, 'Quality_Score'])
+
+@st.fragment
+def render_details_tab(df):
+    """
+    Issue Details tab: documents at or above an issue threshold.
+    Runs as a fragment so moving the threshold reruns only this tab.
+    """
+    st.header("📋 Detailed Issue Analysis")
+    
+    # Filter by issue type
+    if 'Total_Issues' in df.columns:
+        issue_threshold = st.slider("Minimum issues to display", 0, int(df['Total_Issues'].max()), 1)
+        
+        detailed_df = df[df['Total_Issues'] >= issue_threshold]
+        
+        st.markdown(f"Showing {len(detailed_df)} documents with {issue_threshold}+ issues")
+        
+        details = issue_details(st.session_state.data_key, df) if 'Spelling_Errors' in df.columns else None
+        parsed_rows = details.index.unique(level=0) if details is not None else []
+        
+        # One table for the top documents, then drill into a single one
+        top_docs = detailed_df.head(20)
+        detail_columns = [col for col in ['Subject', 'Customer', 'Status', 'Quality_Score', 'Total_Issues',
+                                          'Typos_Count', 'Grammar_Issues', 'Punctuation_Issues']
+                          if col in top_docs.columns]
+        st.dataframe(top_docs[detail_columns], use_container_width=True, hide_index=True)
+        
+        if not top_docs.empty:
+            selected = st.selectbox(
+                "Inspect document",
+                top_docs.index,
+                format_func=lambda idx: f"📄 {top_docs.at[idx, 'Subject'][:50]}... (Score: {top_docs.at[idx, 'Quality_Score']:.0f})"
+            )
+            
+            raw_issues = top_docs.at[selected, 'Spelling_Errors'] if 'Spelling_Errors' in top_docs.columns else None
+            if pd.notna(raw_issues):
+                st.write("**Raw Issues Found:**")
+                st.text(raw_issues[:500] + "..." if len(raw_issues) > 500 else raw_issues)
+            
+            if selected in parsed_rows:
+                st.write("**Parsed Issues:**")
+                st.dataframe(details.xs(selected, level=0), hide_index=True, use_container_width=True)
+
 # ==================== Initialize Session State ====================
 if 'uploaded_data' not in st.session_state:
     st.session_state.uploaded_data = None
@@ -217,47 +746,35 @@ if access_mode == 'admin':
             
             if uploaded_file is not None:
                 try:
-                    excel_file = pd.ExcelFile(uploaded_file)
-                    available_sheets = excel_file.sheet_names
+                    file_bytes = uploaded_file.getvalue()
+                    file_key = hashlib.blake2b(file_bytes, digest_size=16).hexdigest()
                     
-                    # Read Test Sheet with all columns including Q
-                    if 'Test Sheet' in available_sheets:
-                        # Read without headers first to get all columns
-                        df_raw = pd.read_excel(uploaded_file, sheet_name='Test Sheet', header=None)
+                    # Reruns with the same file already loaded skip the parse and the save
+                    if file_key != st.session_state.get('data_key'):
+                        sheets = load_workbook(file_bytes, uploaded_file.name)
                         
-                        # Use first row as headers
-                        headers = df_raw.iloc[0].tolist()
-                        df = df_raw[1:].copy()
+                        # Use Test Sheet if present, otherwise the first sheet
+                        if 'Test Sheet' in sheets:
+                            df = sheets['Test Sheet']
+                        else:
+                            df = next(iter(sheets.values()))
                         
-                        # Assign column names
-                        column_names = []
-                        for i, header in enumerate(headers):
-                            if pd.notna(header):
-                                column_names.append(str(header))
-                            else:
-                                # For column Q (index 16) which might not have a header
-                                if i == 16:
-                                    column_names.append('Spelling_Errors')
-                                else:
-                                    column_names.append(f'Column_{i}')
+                        # Store in session state
+                        st.session_state.uploaded_data = df
+                        st.session_state.last_upload_time = datetime.now()
+                        st.session_state.data_key = file_key
                         
-                        df.columns = column_names
-                        df.reset_index(drop=True, inplace=True)
+                        # Other sheets
+                        if 'Dashboard' in sheets:
+                            st.session_state.dashboard_data = sheets['Dashboard']
                         
-                    else:
-                        df = pd.read_excel(uploaded_file, sheet_name=0)
-                    
-                    # Store in session state
-                    st.session_state.uploaded_data = df
-                    st.session_state.last_upload_time = datetime.now()
-                    
-                    # Read other sheets
-                    if 'Dashboard' in available_sheets:
-                        st.session_state.dashboard_data = pd.read_excel(uploaded_file, sheet_name='Dashboard')
-                    
-                    if 'Run Log' in available_sheets:
-                        st.session_state.run_log = pd.read_excel(uploaded_file, sheet_name='Run Log')
+                        if 'Run Log' in sheets:
+                            st.session_state.run_log = sheets['Run Log']
+                        
+                        # Save for sharing
+                        st.session_state.data_saved = save_data_to_cloud()
                     
+                    df = st.session_state.uploaded_data
                     st.success(f"✅ Successfully loaded {len(df)} NDA records with spelling quality data")
                     
                     # Check if we have the spelling column
@@ -265,8 +782,7 @@ if access_mode == 'admin':
                         non_empty = df['Spelling_Errors'].notna().sum()
                         st.info(f"📝 Found spelling data in {non_empty} documents")
                     
-                    # Save for sharing
-                    if save_data_to_cloud():
+                    if st.session_state.get('data_saved'):
                         st.success("📤 Data saved and ready for sharing!")
                     
                 except Exception as e:
@@ -301,88 +817,49 @@ if access_mode == 'admin':
 # Load shared data if in viewer mode
 if access_mode == 'viewer' or st.session_state.uploaded_data is None:
     shared_data = load_shared_data()
-    if shared_data:
-        if load_data_from_package(shared_data):
-            st.info(f"📊 Viewing shared data (Last updated: {st.session_state.last_upload_time.strftime('%Y-%m-%d %H:%M')} by {st.session_state.last_updated_by})")
+    if shared_data and load_data_from_package(shared_data):
+        st.info(f"📊 Viewing shared data (Last updated: {st.session_state.last_upload_time.strftime('%Y-%m-%d %H:%M')} by {st.session_state.last_updated_by})")
     elif access_mode == 'viewer':
         st.warning("⚠️ No shared data available. Please ask an admin to upload data.")
         st.stop()
 
 # Main Dashboard
 if st.session_state.uploaded_data is not None:
+    # Replace the raw frame with its enriched superset, so the session holds one copy
+    # and reruns skip even the cache copy
+    if st.session_state.get('enriched_key') != st.session_state.data_key:
+        st.session_state.uploaded_data = enrich_dataframe(st.session_state.data_key, st.session_state.uploaded_data)
+        st.session_state.enriched_key = st.session_state.data_key
     df = st.session_state.uploaded_data
     
-    # Add date columns
-    if 'Timestamp' in df.columns:
-        df['Date'] = pd.to_datetime(df['Timestamp']).dt.date
-        df['Week'] = pd.to_datetime(df['Timestamp']).dt.isocalendar().week
-        df['Year'] = pd.to_datetime(df['Timestamp']).dt.year
-        df['Day_of_Week'] = pd.to_datetime(df['Timestamp']).dt.day_name()
-        df['Hour'] = pd.to_datetime(df['Timestamp']).dt.hour
-    
-    # Process spelling quality data from Column Q
-    if 'Spelling_Errors' in df.columns:
-        # Parse spelling errors for each document
-        quality_metrics = df['Spelling_Errors'].apply(parse_spelling_errors)
-        
-        # Extract metrics into separate columns
-        df['Quality_Score'] = quality_metrics.apply(lambda x: x['quality_score'])
-        df['Total_Issues'] = quality_metrics.apply(lambda x: x['total_issues'])
-        df['Typos_Count'] = quality_metrics.apply(lambda x: x['typos'])
-        df['Grammar_Issues'] = quality_metrics.apply(lambda x: x['grammar'])
-        df['Punctuation_Issues'] = quality_metrics.apply(lambda x: x['punctuation'])
-        df['Typography_Issues'] = quality_metrics.apply(lambda x: x['typography'])
-        df['Quality_Category'] = df['Quality_Score'].apply(categorize_quality_score)
-        
-        # Create issue summary
-        df['Issue_Summary'] = df.apply(lambda row: f"Typos: {row['Typos_Count']}, Grammar: {row['Grammar_Issues']}, Punctuation: {row['Punctuation_Issues']}" if row['Total_Issues'] > 0 else "No issues", axis=1)
-    else:
-        # Fallback if no spelling data
-        df['Quality_Score'] = 100
-        df['Total_Issues'] = 0
-        df['Quality_Category'] = 'No Data'
-    
     # Calculate KPIs
     st.markdown("### 📊 Key Performance Indicators")
     
+    kpis = compute_kpis(st.session_state.data_key, df)
+    
     col1, col2, col3, col4, col5, col6 = st.columns(6)
     
     with col1:
-        total_ndas = len(df)
-        st.metric("📥 Total NDAs", total_ndas)
+        st.metric("📥 Total NDAs", kpis.total)
     
     with col2:
-        if 'Status' in df.columns:
-            completed = len(df[df['Status'] == 'Completed'])
-            completion_rate = (completed / total_ndas * 100) if total_ndas > 0 else 0
-            st.metric("✅ Completed", completed, f"{completion_rate:.1f}%")
+        if kpis.completed is not None:
+            st.metric("✅ Completed", kpis.completed, f"{kpis.completion_rate:.1f}%")
         else:
             st.metric("✅ Completed", "N/A")
     
     with col3:
-        if 'Turnaround Time (hrs)' in df.columns:
-            avg_turnaround = df['Turnaround Time (hrs)'].dropna().mean()
-            st.metric("⏱️ Avg Turnaround", f"{avg_turnaround:.1f}h" if not pd.isna(avg_turnaround) else "N/A")
-        else:
-            st.metric("⏱️ Avg Turnaround", "N/A")
+        avg_turnaround = kpis.avg_turnaround
+        st.metric("⏱️ Avg Turnaround", f"{avg_turnaround:.1f}h" if avg_turnaround is not None and not pd.isna(avg_turnaround) else "N/A")
     
     with col4:
-        avg_quality = df['Quality_Score'].mean()
-        st.metric("📊 Avg Quality", f"{avg_quality:.0f}/100")
+        st.metric("📊 Avg Quality", f"{kpis.avg_quality:.0f}/100")
     
     with col5:
-        if 'Total_Issues' in df.columns:
-            total_issues = df['Total_Issues'].sum()
-            st.metric("⚠️ Total Issues", total_issues)
-        else:
-            st.metric("⚠️ Total Issues", "N/A")
+        st.metric("⚠️ Total Issues", kpis.total_issues if kpis.total_issues is not None else "N/A")
     
     with col6:
-        if 'Typos_Count' in df.columns:
-            total_typos = df['Typos_Count'].sum()
-            st.metric("✍️ Total Typos", total_typos)
-        else:
-            st.metric("✍️ Total Typos", "N/A")
+        st.metric("✍️ Total Typos", kpis.total_typos if kpis.total_typos is not None else "N/A")
     
     st.divider()
     
@@ -398,97 +875,7 @@ if st.session_state.uploaded_data is not None:
     
     # Tab 1: NDA Threads
     with tab1:
-        st.header("NDA Email Threads with Quality Metrics")
-        
-        # Filters - First Row
-        col1, col2, col3 = st.columns(3)
-        
-        with col1:
-            if 'Status' in df.columns:
-                status_filter = st.multiselect(
-                    "Filter by Status",
-                    options=df['Status'].dropna().unique().tolist(),
-                    default=df['Status'].dropna().unique().tolist()
-                )
-            else:
-                status_filter = []
-        
-        with col2:
-            if 'Customer' in df.columns:
-                customer_filter = st.multiselect(
-                    "Filter by Customer",
-                    options=sorted(df['Customer'].dropna().unique().tolist()),
-                    default=[]
-                )
-            else:
-                customer_filter = []
-        
-        with col3:
-            if 'Quality_Category' in df.columns:
-                quality_filter = st.multiselect(
-                    "Filter by Quality",
-                    options=df['Quality_Category'].unique().tolist(),
-                    default=[]
-                )
-            else:
-                quality_filter = []
-        
-        # Filters - Second Row
-        col1, col2, col3 = st.columns(3)
-        
-        with col1:
-            search_term = st.text_input("🔍 Search in Subject", "")
-        
-        with col2:
-            min_issues = st.number_input("Min Issues to Show", min_value=0, value=0)
-        
-        with col3:
-            # Quality score range filter
-            if 'Quality_Score' in df.columns:
-                score_range = st.slider(
-                    "Quality Score Range",
-                    min_value=0,
-                    max_value=100,
-                    value=(0, 100),
-                    step=5
-                )
-            else:
-                score_range = (0, 100)
-        
-        # Apply filters
-        filtered_df = df.copy()
-        
-        if status_filter and 'Status' in df.columns:
-            filtered_df = filtered_df[filtered_df['Status'].isin(status_filter)]
-        
-        if customer_filter and 'Customer' in df.columns:
-            filtered_df = filtered_df[filtered_df['Customer'].isin(customer_filter)]
-        
-        if quality_filter and 'Quality_Category' in df.columns:
-            filtered_df = filtered_df[filtered_df['Quality_Category'].isin(quality_filter)]
-        
-        if search_term and 'Subject' in df.columns:
-            filtered_df = filtered_df[filtered_df['Subject'].str.contains(search_term, case=False, na=False)]
-        
-        if 'Total_Issues' in df.columns:
-            filtered_df = filtered_df[filtered_df['Total_Issues'] >= min_issues]
-        
-        if 'Quality_Score' in df.columns:
-            filtered_df = filtered_df[(filtered_df['Quality_Score'] >= score_range[0]) & 
-                                     (filtered_df['Quality_Score'] <= score_range[1])]
-        
-        # Display
-        st.markdown(f"**Showing {len(filtered_df)} of {len(df)} records**")
-        
-        display_columns = ['Timestamp', 'Subject', 'Customer', 'Status', 'Quality_Score', 
-                          'Total_Issues', 'Quality_Category', 'Issue_Summary']
-        display_columns = [col for col in display_columns if col in filtered_df.columns]
-        
-        st.dataframe(
-            filtered_df[display_columns],
-            use_container_width=True,
-            height=400
-        )
+        render_threads_tab(df)
     
     # Tab 2: Quality Analysis
     with tab2:
@@ -499,194 +886,77 @@ if st.session_state.uploaded_data is not None:
         col1, col2, col3, col4 = st.columns(4)
         
         with col1:
-            avg_quality = df['Quality_Score'].mean()
-            st.metric("Average Quality Score", f"{avg_quality:.0f}/100")
+            st.metric("Average Quality Score", f"{kpis.avg_quality:.0f}/100")
         
         with col2:
-            excellent_docs = len(df[df['Quality_Score'] >= 90])
-            st.metric("Excellent Quality (≥90)", excellent_docs)
+            st.metric("Excellent Quality (≥90)", quality_bands(st.session_state.data_key, df).excellent)
         
         with col3:
-            poor_docs = len(df[df['Quality_Score'] < 60])
-            st.metric("Poor Quality (<60)", poor_docs)
+            st.metric("Poor Quality (<60)", quality_bands(st.session_state.data_key, df).poor)
         
         with col4:
             if 'Total_Issues' in df.columns:
-                avg_issues = df['Total_Issues'].mean()
-                st.metric("Avg Issues per Doc", f"{avg_issues:.1f}")
+                st.metric("Avg Issues per Doc", f"{kpis.avg_issues:.1f}")
         
         # Issue type breakdown
         if all(col in df.columns for col in ['Typos_Count', 'Grammar_Issues', 'Punctuation_Issues', 'Typography_Issues']):
             st.subheader("Issue Type Distribution")
             
-            issue_totals = {
-                'Typos': df['Typos_Count'].sum(),
-                'Grammar': df['Grammar_Issues'].sum(),
-                'Punctuation': df['Punctuation_Issues'].sum(),
-                'Typography': df['Typography_Issues'].sum()
-            }
+            # One reduction over the four count columns
+            issue_totals = df[['Typos_Count', 'Grammar_Issues', 'Punctuation_Issues', 'Typography_Issues']].sum()
+            issue_totals.index = ['Typos', 'Grammar', 'Punctuation', 'Typography']
             
-            issue_df = pd.DataFrame(list(issue_totals.items()), columns=['Issue Type', 'Count'])
-            st.bar_chart(issue_df.set_index('Issue Type'))
+            st.bar_chart(issue_totals.rename('Count').rename_axis('Issue Type'))
         
         # Quality distribution
         st.subheader("Quality Score Distribution")
-        quality_dist = df['Quality_Category'].value_counts()
+        # Categorical value_counts lists every band; keep only the observed ones
+        quality_dist = df['Quality_Category'].value_counts().loc[lambda counts: counts > 0]
         st.bar_chart(quality_dist)
         
         # Documents with most issues
         st.subheader("Documents with Most Issues")
         if 'Total_Issues' in df.columns:
-            worst_docs = df.nlargest(10, 'Total_Issues')[['Subject', 'Customer', 'Quality_Score', 'Total_Issues', 'Issue_Summary']]
-            st.dataframe(worst_docs, use_container_width=True)
+            st.dataframe(worst_documents(st.session_state.data_key, df), use_container_width=True)
         
         # Quality by customer
         if 'Customer' in df.columns:
             st.subheader("Quality by Customer")
-            customer_quality = df.groupby('Customer').agg({
-                'Quality_Score': 'mean',
-                'Total_Issues': 'sum',
-                'Subject': 'count'
-            }).round(1)
-            customer_quality.columns = ['Avg Quality Score', 'Total Issues', 'Document Count']
-            customer_quality = customer_quality.sort_values('Avg Quality Score', ascending=False)
-            st.dataframe(customer_quality, use_container_width=True)
+            st.dataframe(customer_quality(st.session_state.data_key, df), use_container_width=True)
     
     # Tab 3: Daily Analytics
     with tab3:
-        st.header("Daily Analytics Dashboard")
-        
-        if 'Date' in df.columns:
-            available_dates = sorted(df['Date'].unique(), reverse=True)
-            selected_date = st.selectbox("Select Date", available_dates, index=0)
-            
-            daily_df = df[df['Date'] == selected_date]
-            
-            # Daily metrics
-            col1, col2, col3, col4 = st.columns(4)
-            
-            with col1:
-                st.metric("Total NDAs", len(daily_df))
-            
-            with col2:
-                daily_avg_quality = daily_df['Quality_Score'].mean()
-                st.metric("Avg Quality", f"{daily_avg_quality:.0f}/100")
-            
-            with col3:
-                if 'Total_Issues' in daily_df.columns:
-                    daily_total_issues = daily_df['Total_Issues'].sum()
-                    st.metric("Total Issues", daily_total_issues)
-            
-            with col4:
-                if 'Typos_Count' in daily_df.columns:
-                    daily_typos = daily_df['Typos_Count'].sum()
-                    st.metric("Typos Found", daily_typos)
-            
-            # Quality distribution for the day
-            st.subheader("Quality Distribution")
-            if 'Quality_Category' in daily_df.columns:
-                daily_quality_dist = daily_df['Quality_Category'].value_counts()
-                st.bar_chart(daily_quality_dist)
+        render_daily_tab(df)
     
     # Tab 4: Weekly Analytics
     with tab4:
-        st.header("Weekly Analytics Dashboard")
-        
-        if 'Week' in df.columns and 'Year' in df.columns:
-            df['Year_Week'] = df['Year'].astype(str) + '-W' + df['Week'].astype(str).str.zfill(2)
-            available_weeks = sorted(df['Year_Week'].unique(), reverse=True)
-            selected_week = st.selectbox("Select Week", available_weeks, index=0 if available_weeks else None)
-            
-            if selected_week:
-                weekly_df = df[df['Year_Week'] == selected_week]
-                
-                # Weekly metrics
-                col1, col2, col3, col4, col5 = st.columns(5)
-                
-                with col1:
-                    st.metric("Total NDAs", len(weekly_df))
-                
-                with col2:
-                    weekly_avg_quality = weekly_df['Quality_Score'].mean()
-                    st.metric("Avg Quality", f"{weekly_avg_quality:.0f}/100")
-                
-                with col3:
-                    if 'Total_Issues' in weekly_df.columns:
-                        weekly_issues = weekly_df['Total_Issues'].sum()
-                        st.metric("Total Issues", weekly_issues)
-                
-                with col4:
-                    excellent_week = len(weekly_df[weekly_df['Quality_Score'] >= 90])
-                    st.metric("Excellent Docs", excellent_week)
-                
-                with col5:
-                    poor_week = len(weekly_df[weekly_df['Quality_Score'] < 60])
-                    st.metric("Poor Docs", poor_week)
-                
-                # Daily quality trend within week
-                if 'Date' in weekly_df.columns:
-                    st.subheader("Daily Quality Trend")
-                    daily_quality = weekly_df.groupby('Date')['Quality_Score'].mean()
-                    st.line_chart(daily_quality)
+        render_weekly_tab(df)
     
     # Tab 5: Trends
     with tab5:
         st.header("Quality Trends Over Time")
         
         if 'Date' in df.columns:
+            trends = trend_frames(st.session_state.data_key, df)
+            
             # Quality score trend
             st.subheader("Quality Score Trend")
-            quality_trend = df.groupby('Date')['Quality_Score'].mean()
-            st.line_chart(quality_trend)
+            st.line_chart(trends['Quality_Score'])
             
             # Issue count trend
-            if 'Total_Issues' in df.columns:
+            if 'Total_Issues' in trends.columns:
                 st.subheader("Total Issues Trend")
-                issues_trend = df.groupby('Date')['Total_Issues'].sum()
-                st.line_chart(issues_trend)
+                st.line_chart(trends['Total_Issues'])
             
             # Issue type trends
-            if all(col in df.columns for col in ['Typos_Count', 'Grammar_Issues', 'Punctuation_Issues']):
+            issue_type_cols = ['Typos_Count', 'Grammar_Issues', 'Punctuation_Issues']
+            if all(col in trends.columns for col in issue_type_cols):
                 st.subheader("Issue Types Over Time")
-                issue_trends = df.groupby('Date').agg({
-                    'Typos_Count': 'sum',
-                    'Grammar_Issues': 'sum',
-                    'Punctuation_Issues': 'sum'
-                })
-                st.line_chart(issue_trends)
+                st.line_chart(trends[issue_type_cols])
     
     # Tab 6: Issue Details
     with tab6:
-        st.header("📋 Detailed Issue Analysis")
-        
-        # Filter by issue type
-        if 'Total_Issues' in df.columns:
-            issue_threshold = st.slider("Minimum issues to display", 0, int(df['Total_Issues'].max()), 1)
-            
-            detailed_df = df[df['Total_Issues'] >= issue_threshold].copy()
-            
-            st.markdown(f"Showing {len(detailed_df)} documents with {issue_threshold}+ issues")
-            
-            # Show detailed breakdown
-            for idx, row in detailed_df.head(20).iterrows():
-                with st.expander(f"📄 {row['Subject'][:50]}... (Score: {row['Quality_Score']:.0f})"):
-                    col1, col2 = st.columns(2)
-                    
-                    with col1:
-                        st.write(f"**Customer:** {row.get('Customer', 'N/A')}")
-                        st.write(f"**Status:** {row.get('Status', 'N/A')}")
-                        st.write(f"**Quality Score:** {row['Quality_Score']:.0f}/100")
-                    
-                    with col2:
-                        st.write(f"**Total Issues:** {row['Total_Issues']}")
-                        if 'Typos_Count' in row:
-                            st.write(f"**Typos:** {row['Typos_Count']}")
-                            st.write(f"**Grammar:** {row.get('Grammar_Issues', 0)}")
-                            st.write(f"**Punctuation:** {row.get('Punctuation_Issues', 0)}")
-                    
-                    if 'Spelling_Errors' in row and pd.notna(row['Spelling_Errors']):
-                        st.write("**Raw Issues Found:**")
-                        st.text(row['Spelling_Errors'][:500] + "..." if len(str(row['Spelling_Errors'])) > 500 else row['Spelling_Errors'])
+        render_details_tab(df)
 
 else:
     # Instructions
@@ -713,18 +983,16 @@ with st.sidebar:
         st.info("👁️ Viewer Mode")
     
     if st.session_state.uploaded_data is not None:
-        df = st.session_state.uploaded_data
+        # df is the enriched frame from the main dashboard block above
         st.divider()
         st.header("📊 Quality Summary")
         
         if 'Quality_Score' in df.columns:
-            st.metric("Avg Quality", f"{df['Quality_Score'].mean():.0f}/100")
+            kpis = compute_kpis(st.session_state.data_key, df)
+            st.metric("Avg Quality", f"{kpis.avg_quality:.0f}/100")
             
-            # Quality breakdown
-            excellent = len(df[df['Quality_Score'] >= 90])
-            good = len(df[(df['Quality_Score'] >= 75) & (df['Quality_Score'] < 90)])
-            fair = len(df[(df['Quality_Score'] >= 60) & (df['Quality_Score'] < 75)])
-            poor = len(df[df['Quality_Score'] < 60])
+            # Quality breakdown, cached alongside the KPIs
+            poor, fair, good, excellent = quality_bands(st.session_state.data_key, df)
             
             st.write("**Quality Distribution:**")
             st.write(f"🌟 Excellent: {excellent}")
@@ -735,8 +1003,8 @@ with st.sidebar:
         if 'Total_Issues' in df.columns:
             st.divider()
             st.write("**Issue Statistics:**")
-            st.write(f"📝 Total Issues: {df['Total_Issues'].sum()}")
-            st.write(f"📊 Avg per Doc: {df['Total_Issues'].mean():.1f}")
+            st.write(f"📝 Total Issues: {kpis.total_issues}")
+            st.write(f"📊 Avg per Doc: {kpis.avg_issues:.1f}")
 
 # Footer
 st.divider()